@@ -7,17 +7,26 @@ local HOST, PORT = "192.168.10.242", 3344
 local sock = nil
 local connection_attempts = 0
 local max_reconnect_attempts = 5
-local reconnect_delay = 2  -- seconds between reconnection attempts
+local initial_reconnect_delay = 2  -- seconds before the first retry
+local reconnect_delay = initial_reconnect_delay  -- seconds between reconnection attempts
+local next_connect_time = 0  -- earliest socket.gettime() at which a reconnection may be attempted
+local connect_timeout = 15  -- seconds an in-progress connection may take before it is abandoned
+local connecting_sock = nil  -- socket whose non-blocking connect has not completed yet
+local connect_deadline = 0  -- socket.gettime() at which connecting_sock is abandoned
+local reported_disconnect = false  -- "No connection" already printed for this outage
+local send_buffer_size = 1024 * 1024  -- room for a few ~295 KB RGB frames
 
 -- Connection state tracking
 local last_successful_frame = 0
 local consecutive_errors = 0
 local max_consecutive_errors = 10
-local rgb = {}
+local save_first_frame = true  -- write screens.ppm from the first captured frame
+local log_actions = false  -- print every received action (console output is slow in DeSmuME)
+local pending_input = ""  -- bytes of a 12-byte action that arrived split across reads
 
 
 -- wall‑clock timestamp of the last health report
-local last_report_time = os.time()
+local last_report_time = socket.gettime()
 
 -- helper for 32-bit little-endian
 local function le32(n)
@@ -39,12 +48,6 @@ local function le16(n)
     )
 end
 
--- helper: convert 4‑byte little‑endian string → integer
-local function le32_to_int(bytes)
-    local b1, b2, b3, b4 = bytes:byte(1, 4)
-    return b1 + b2 * 256 + b3 * 65536 + b4 * 16777216
-end
-
 -- Frame creation helper - matches Rust server's frame_reader expectations
 local function create_frame(tag, data)
     local frame_data = string.char(tag) .. (data or "")
@@ -66,69 +69,120 @@ local function create_handshake_frame(version, name, program)
     return create_frame(1, data)  -- tag 1 = handshake
 end
 
--- Create ping frame
-local function create_ping_frame()
-    return create_frame(0)  -- tag 0 = ping, no data
-end
-
--- Create shutdown frame
-local function create_shutdown_frame()
-    return create_frame(3)  -- tag 3 = shutdown, no data
-end
+-- Frame geometry: both DS screens stacked vertically. The header that
+-- precedes the pixels never changes, so it is encoded once here.
+local screen_width, screen_height = 256, 384
+local raw_frame_len = screen_width * screen_height * 4  -- 393_216 bytes of 4-byte pixels
+local rgb_frame_len = screen_width * screen_height * 3  -- 294_912 bytes once alpha is dropped
+local image_header = le32(screen_width) .. le32(screen_height)
+local rgb_frame_tag = 2  -- tag 2 = RGB; pixels are always converted before sending
+-- Length, tag and image header of every RGB frame, i.e. everything create_frame
+-- would put in front of the pixels. Prepending it in one concatenation avoids
+-- copying the whole payload once per header layer.
+local rgb_frame_prefix = le32(1 + #image_header + rgb_frame_len)
+    .. string.char(rgb_frame_tag) .. image_header
 
 local frame_counter = 0
 local first_frame = true
 local target_fps = 60  -- Target FPS
 local frame_time_target = 1.0 / target_fps  -- Target time per frame
-local last_frame_time = socket.gettime()
+local next_frame_time = socket.gettime()
+
+-- Adopts a socket whose connection has completed.
+local function finish_connection(new_sock)
+    sock = new_sock
+    sock:settimeout(15)  -- Increased timeout for more stability
+    print("[Lua] ✅ Connected to server successfully!")
+
+    -- Flush the small action round-trips immediately instead of
+    -- letting Nagle hold them back, and give the kernel room for a
+    -- whole frame so send() returns without waiting on the peer.
+    sock:setoption("tcp-nodelay", true)
+    -- Older LuaSocket builds reject the buffer option, so it is best effort.
+    pcall(sock.setoption, sock, "send-buffer-size", send_buffer_size)
+
+    -- -- Send handshake frame to identify this client
+    -- local handshake = create_handshake_frame(1, "PokemonBot_DeSmuME", 1001)
+    -- local handshake_result, handshake_err = sock:send(handshake)
+    -- if handshake_result then
+    --     print("[Lua] ✅ Handshake sent successfully!")
+    -- else
+    --     print(string.format("[Lua] ⚠️  Handshake failed: %s", handshake_err or "unknown"))
+    -- end
+
+    connection_attempts = 0
+    reconnect_delay = initial_reconnect_delay
+    consecutive_errors = 0
+    pending_input = ""
+    reported_disconnect = false
+    return true
+end
+
+-- Drops a failed attempt and schedules the next one with exponential backoff.
+local function fail_connection(now, err)
+    print(string.format("[Lua] ❌ Connection failed: %s", err or "unknown error"))
+    if connecting_sock then
+        connecting_sock:close()
+        connecting_sock = nil
+    end
+    next_connect_time = now + reconnect_delay
+    print(string.format("[Lua] Next connection attempt in %.1f seconds", reconnect_delay))
+    reconnect_delay = math.min(reconnect_delay * 1.5, 10)  -- Exponential backoff, max 10 seconds
+    return false
+end
 
--- Robust connection function with retry logic
+-- Drives the connection without ever blocking the frame callback. The connect
+-- is started non-blocking and later calls poll it for completion; while it is
+-- in progress, or during the backoff after a failure, this returns false.
 local function connect_to_server()
     if sock then
         sock:close()
         sock = nil
     end
-    
-    local attempts = 0
-    while attempts < max_reconnect_attempts do
-        attempts = attempts + 1
-        print(string.format("[Lua] Connection attempt %d/%d...", attempts, max_reconnect_attempts))
-        
-        sock = socket.tcp()
-        if sock then
-            sock:settimeout(15)  -- Increased timeout for more stability
-            local success, err = sock:connect(HOST, PORT)
-            if success then
-                print("[Lua] ✅ Connected to server successfully!")
-                
-                -- -- Send handshake frame to identify this client
-                -- local handshake = create_handshake_frame(1, "PokemonBot_DeSmuME", 1001)
-                -- local handshake_result, handshake_err = sock:send(handshake)
-                -- if handshake_result then
-                --     print("[Lua] ✅ Handshake sent successfully!")
-                -- else
-                --     print(string.format("[Lua] ⚠️  Handshake failed: %s", handshake_err or "unknown"))
-                -- end
-                
-                connection_attempts = 0
-                consecutive_errors = 0
-                return true
-            else
-                print(string.format("[Lua] ❌ Connection failed: %s", err or "unknown error"))
-                sock:close()
-                sock = nil
+
+    local now = socket.gettime()
+    if connecting_sock then
+        -- A non-blocking connect has finished once the socket turns writable;
+        -- only a connected socket has a peer.
+        local _, writable = socket.select(nil, {connecting_sock}, 0)
+        if writable[connecting_sock] then
+            local pending = connecting_sock
+            connecting_sock = nil
+            if pending:getpeername() then
+                return finish_connection(pending)
             end
+            pending:close()
+            return fail_connection(now, "connection refused")
+        elseif now >= connect_deadline then
+            return fail_connection(now, "timeout")
         end
-        
-        if attempts < max_reconnect_attempts then
-            print(string.format("[Lua] Waiting %d seconds before retry...", reconnect_delay))
-            socket.sleep(reconnect_delay)
-            reconnect_delay = math.min(reconnect_delay * 1.5, 10)  -- Exponential backoff, max 10 seconds
-        end
+        return false
     end
-    
-    print("[Lua] ❌ Failed to connect after maximum attempts")
-    return false
+
+    if now < next_connect_time then
+        return false
+    end
+
+    connection_attempts = connection_attempts + 1
+    print(string.format("[Lua] Connection attempt %d...", connection_attempts))
+
+    local new_sock, err = socket.tcp()
+    if not new_sock then
+        return fail_connection(now, err)
+    end
+    new_sock:settimeout(0)
+    local success
+    success, err = new_sock:connect(HOST, PORT)
+    if success then
+        return finish_connection(new_sock)
+    elseif err == "timeout" then
+        -- Still in progress; later calls complete it.
+        connecting_sock = new_sock
+        connect_deadline = now + connect_timeout
+        return false
+    end
+    new_sock:close()
+    return fail_connection(now, err)
 end
 
 -- Check if connection is still alive
@@ -150,186 +204,156 @@ local function process_input(input)
         return nil
     end
     
-    -- Extract action bytes from input
-    local action = input:sub(1, 12)
+    -- Unpack all 12 action bytes with a single call
+    local a, b, sel, start, up, down, left, right, x, y, l, r = input:byte(1, 12)
     
-    print(string.format("[Lua] Received action: %s", table.concat(action_bytes, " ")))
-
-    -- Validate action length
-    if #action ~= 12 then
-        print(string.format("[Lua] ❌ Invalid action length: %d bytes", #action))
-        return nil
+    if log_actions then
+        print(string.format("[Lua] Received action: %d %d %d %d %d %d %d %d %d %d %d %d",
+                            a, b, sel, start, up, down, left, right, x, y, l, r))
     end
 
     -- send the action to joypad    
 
     joypad.set{
-        A=action:byte(1)~=0,      -- Button A
-        B=action:byte(2)~=0,      -- Button B  
-        Select=action:byte(3)~=0, -- Select
-        Start=action:byte(4)~=0,  -- Start
-        Up=action:byte(5)~=0,     -- D-pad Up
-        Down=action:byte(6)~=0,   -- D-pad Down
-        Left=action:byte(7)~=0,   -- D-pad Left
-        Right=action:byte(8)~=0,  -- D-pad Right
-        X=action:byte(9)~=0,      -- Button X
-        Y=action:byte(10)~=0,     -- Button Y
-        L=action:byte(11)~=0,     -- Left shoulder
-        R=action:byte(12)~=0,     -- Right shoulder
+        A=a~=0,             -- Button A
+        B=b~=0,             -- Button B  
+        Select=sel~=0,      -- Select
+        Start=start~=0,     -- Start
+        Up=up~=0,           -- D-pad Up
+        Down=down~=0,       -- D-pad Down
+        Left=left~=0,       -- D-pad Left
+        Right=right~=0,     -- D-pad Right
+        X=x~=0,             -- Button X
+        Y=y~=0,             -- Button Y
+        L=l~=0,             -- Left shoulder
+        R=r~=0,             -- Right shoulder
     }
 
 end
 
 local function receive_input()
+    if not sock then
+        return nil  -- Disconnected; the send path schedules the reconnection
+    end
     sock:settimeout(0)  -- Non-blocking mode
-    while true do
-        local input, err = sock:receive(12)  -- Expecting 12-byte action response
-        if input then
-            return process_input(input)
-        elseif err == "timeout" then
-            return nil  -- No input available, continue processing
-        elseif err == "closed" or err == "broken pipe" then
-            print("[Lua] Connection lost during receive, attempting reconnection...")
-            connect_to_server()
-            return nil  -- Reconnection handled, no input to process
+    -- One read per frame; a short read is carried over as the prefix of the
+    -- next one instead of being dropped and desyncing the action stream.
+    local input, err, partial = sock:receive(12, pending_input)  -- Expecting 12-byte action response
+    if input then
+        pending_input = ""
+        return process_input(input)
+    elseif err == "timeout" then
+        pending_input = partial or pending_input
+        return nil  -- No complete action yet, continue processing
+    elseif err == "closed" or err == "broken pipe" then
+        print("[Lua] Connection lost during receive, attempting reconnection...")
+        connect_to_server()
+        return nil  -- Reconnection handled, no input to process
+    else
+        print(string.format("[Lua] Receive error: %s", err or "unknown"))
+        return nil  -- Other errors, skip this frame
+    end
+end
+
+-- Convert each 4-byte pixel to RGB by dropping its leading alpha byte. A
+-- replacement string keeps the whole pass inside gsub's C loop instead of
+-- calling back into Lua and concatenating strings for every pixel.
+local function convert_to_rgb_from_bgra(data)
+    return (data:gsub(".(...)", "%1"))
+end
+
+-- One-time diagnostics for the first captured frame, kept out of the per-frame path
+local function report_first_frame(screens_raw, pixels, total_size)
+    print(string.format("[Lua] Raw screen data: %d bytes", #screens_raw))
+    -- Save the image data to files for debugging. The converted pixels are
+    -- already the R G B payload a PPM needs, so no second conversion pass.
+    if save_first_frame then
+        local screen_file = io.open("screens.ppm", "wb")
+        if screen_file then
+            screen_file:write(string.format("P6 %d %d 255\n", screen_width, screen_height))
+            screen_file:write(pixels)
+            screen_file:close()
         else
-            print(string.format("[Lua] Receive error: %s", err or "unknown"))
-            return nil  -- Other errors, skip this frame
+            print("[Lua] ❌ Failed to write bottom screen data to file")
         end
-    end 
-end 
+    end
+    print("[Lua] ✅ Screens captured successfully, processing data...")
+    print(string.format("[Lua] Screen size: %d bytes", #screens_raw))
+    print("[Lua] Processing frames...")
+    -- Calculate expected sizes to determine format
+    local bytes_per_pixel = #screens_raw / (screen_width * screen_height)
+    print(string.format("[Lua] %.1f bytes/pixel", bytes_per_pixel))
+
+    print(string.format("[Lua] After conversion - Top: %d bytes", #pixels))
+    print(string.format("[Lua] Expected RGB: %d bytes", rgb_frame_len))
+
+    print(string.format("[Lua] 📸 Sending frame with tag %d (RGB format)", rgb_frame_tag))
+    print(string.format("[Lua] Frame %d: Total frame size=%d bytes", frame_counter, total_size))
+    print(string.format("[Lua] Frame structure: length(4) + tag(1) + width(4) + height(4) + RGB_data(%d)", #pixels))
+    
+    -- Validate final size for RGB data
+    if #pixels > rgb_frame_len then
+        print(string.format("[Lua] ⚠️  Warning: RGB data larger than expected (%d vs %d)", #pixels, rgb_frame_len))
+    else
+        print(string.format("[Lua] ✅ RGB data size looks correct (%d bytes)", #pixels))
+    end
+end
 
 -- Robust frame sending with error recovery
 local function send_frame_and_get_action()
     -- Frame rate limiting
     local current_time = socket.gettime()
-    local time_since_last_frame = current_time - last_frame_time
     
-    if time_since_last_frame < frame_time_target then
+    if current_time < next_frame_time then
         -- Skip this frame to maintain target FPS
         return
     end
     
-    last_frame_time = current_time
+    -- Advance on a fixed schedule rather than from the callback time, so a
+    -- callback that fires slightly early isn't dropped; resync if we fell behind.
+    next_frame_time = math.max(next_frame_time + frame_time_target, current_time)
     frame_counter = frame_counter + 1
     
     -- Check connection health periodically
-    if frame_counter % 100 == 0 and not is_connection_alive() then
+    if sock and frame_counter % 100 == 0 and not is_connection_alive() then
         print("[Lua] ⚠️  Connection health check failed, attempting reconnection...")
         if not connect_to_server() then
             print("[Lua] ❌ Reconnection failed, skipping this frame")
             return
         end
     end
+
+    -- Ensure we have a valid connection before paying for the capture and
+    -- conversion. While reconnecting this runs every frame, so report it once.
+    if not sock and not connect_to_server() then
+        if not reported_disconnect then
+            print("[Lua] ❌ No connection available, skipping frames until reconnected")
+            reported_disconnect = true
+        end
+        return
+    end
     
     local raw_buf = gui.gdscreenshot(0)      -- both screens, GD2 header + pixels
-    local expected_len = 256 * 384 * 4       -- 393_216 bytes for one 256×384 RGBA frame
 
     -- Skip the 7‑byte GD2 header and take exactly the expected pixel payload.
     -- Any padding bytes after the payload are ignored.
-    local screens_raw = raw_buf:sub(8, 8 + expected_len - 1)
-
-    if #screens_raw ~= expected_len then
-        print(string.format("[Lua] Error: sliced %d bytes, expected %d", #screens_raw, expected_len))
-        return
-    end
-    if not screens_raw or #screens_raw == 0 then
-        print("[Lua] ERROR: failed to capture screens")
-        return
-    end
+    local screens_raw = raw_buf:sub(8, 8 + raw_frame_len - 1)
 
-    if #screens_raw % 4 ~= 0 then
-        print(string.format("[Lua] Error: Raw screen data size is not a multiple of 4 (%d bytes)", #screens_raw))
+    if #screens_raw ~= raw_frame_len then
+        print(string.format("[Lua] Error: sliced %d bytes, expected %d", #screens_raw, raw_frame_len))
         return
     end
     
-    local screen_pixels
-    
-    if first_frame then
-        print(string.format("[Lua] Raw screen data: %d bytes", #screens_raw))
-        -- Save the image data to files for debugging
-        local screen_file = io.open("screens.ppm", "wb")
-        if screen_file then
-            local width, height = 256, 384
-            -- peek the first pixel's four BGRA bytes
-
-            for i = 1, #screens_raw, 4 do
-                -- GD2 pixel order is A R G B; convert to R G B
-                local r = screens_raw:byte(i + 1)         -- source order: B
-                local g = screens_raw:byte(i + 2)     -- source order: G
-                local b = screens_raw:byte(i + 3)     -- source order: R
-                rgb[#rgb + 1] = string.char(r, g, b)  -- write as R G B
-            end
-            local rgb_blob = table.concat(rgb)
-            screen_file:write(string.format("P6 %d %d 255\n", width, height))
-            screen_file:write(rgb_blob)
-            screen_file:close()
-        else
-            print("[Lua] ❌ Failed to write bottom screen data to file")
-        end
-        print("[Lua] ✅ Screens captured successfully, processing data...")
-        print(string.format("[Lua] Screen size: %d bytes", #screens_raw))
-        print("[Lua] Processing frames...")
-        -- Calculate expected sizes to determine format
-        local screen_pixels = 256 * 384 
-        local bytes_per_pixel = #screens_raw / screen_pixels
-        print(string.format("[Lua] %.1f bytes/pixel", bytes_per_pixel))
-
-        print("[Lua] Converting raw pixel data to RGB format...")
-    end
-    
-    -- Convert to RGB based on detected format
-    local function convert_to_rgb_from_bgra(data)
-        -- Use gsub for much faster bulk processing instead of loops
-        local rgb = data:gsub("(.)(.)(.)(.)", function(a, r, g, b)
-            return r .. g .. b  -- Convert BGRA to RGB, skip alpha
-        end)
-        return rgb
-    end
-
-    pixels = convert_to_rgb_from_bgra(screens_raw)
+    local pixels = convert_to_rgb_from_bgra(screens_raw)
     
-    -- Create appropriate frame based on detected format
-    local width, height = 256, 384
-    local image_data = le32(width) .. le32(height) .. pixels
-
-    if first_frame then
-        print(string.format("[Lua] After conversion - Top: %d bytes", #pixels))
-        print(string.format("[Lua] Expected RGB: %d bytes", width * height * 3))
-    end
-    
-    
-    -- Determine frame type based on data format
-    local is_gd2 = (#screens_raw >= 4 and screens_raw:sub(1,3) == "GD2")
-    local frame_tag = is_gd2 and 4 or 2  -- tag 4 = GD2, tag 2 = RGB
-    local blob = create_frame(frame_tag, image_data)
+    local blob = rgb_frame_prefix .. pixels
     
     local total_size = #blob
     if first_frame then
-        local format_name = is_gd2 and "GD2" or "RGB"
-        print(string.format("[Lua] 📸 Sending frame with tag %d (%s format)", frame_tag, format_name))
-        print(string.format("[Lua] Frame %d: Total frame size=%d bytes", frame_counter, total_size))
-        print(string.format("[Lua] Frame structure: length(4) + tag(1) + width(4) + height(4) + %s_data(%d)", format_name, #pixels))
-        
-        -- Validate final size for RGB data
-        if not is_gd2 then
-            local expected_rgb_size = 256 * 384 * 3  -- 294,912 bytes for RGB
-            if #pixels > expected_rgb_size then
-                print(string.format("[Lua] ⚠️  Warning: RGB data larger than expected (%d vs %d)", #pixels, expected_rgb_size))
-            else
-                print(string.format("[Lua] ✅ RGB data size looks correct (%d bytes)", #pixels))
-            end
-        end
-        
+        report_first_frame(screens_raw, pixels, total_size)
         first_frame = false
     end
     
-    -- Ensure we have a valid connection
-    if not sock and not connect_to_server() then
-        print("[Lua] ❌ No connection available, skipping frame")
-        return
-    end
-    
     -- Send the complete GD2 blob with retry logic
     local send_attempts = 0
     local max_send_attempts = 3
@@ -379,31 +403,27 @@ local function send_frame_and_get_action()
     local receive_attempts = 0
     local max_receive_attempts = 3
     
-    -- Debug: Show button presses and connection status occasionally
+    -- Periodic connection status and health report
     if frame_counter % 500 == 0 then
-        local status_msg = string.format("[Lua] Frame %d: Connection stable, %d consecutive errors",
-                                        frame_counter, consecutive_errors)
-        print(status_msg)
-    end
+        print(string.format("[Lua] Frame %d: Connection stable, %d consecutive errors",
+                            frame_counter, consecutive_errors))
 
-    -- Periodic connection health report
-    if frame_counter % 500 == 0 then
-        local now = os.time()
-        local uptime_seconds = now - last_report_time
+        -- Reuse the timestamp taken for frame pacing instead of reading the clock again
+        local uptime_seconds = current_time - last_report_time
         local uptime_frames  = frame_counter - last_successful_frame
 
         -- avoid division by zero
         local fps = uptime_seconds > 0 and (uptime_frames / uptime_seconds) or 0
 
         print(string.format(
-            "[Lua] 🕒 Uptime: %d seconds, Frames since last success: %d, Errors: %d",
+            "[Lua] 🕒 Uptime: %.1f seconds, Frames since last success: %d, Errors: %d",
             uptime_seconds, uptime_frames, consecutive_errors))
 
         print(string.format(
             "[Lua] 🔋 Health Report - Frame %d, %d frames since last success, %d errors, fps: %.2f",
             frame_counter, uptime_frames, consecutive_errors, fps))
 
-        last_report_time = now
+        last_report_time = current_time
         last_successful_frame = frame_counter
     end
 end
@@ -435,8 +455,19 @@ end)
 print("[Lua] 🤖 Robust Pokemon Bot started!")
 print("[Lua] 🛡️  Features: Auto-reconnect, Error recovery, Stability")
 
--- Initial connection
-if connect_to_server() then
+-- Initial connection; the emulator is not running yet, so waiting out the
+-- backoff between attempts here is harmless
+local connected = connect_to_server()
+while not connected and (connecting_sock or connection_attempts < max_reconnect_attempts) do
+    if connecting_sock then
+        socket.select(nil, {connecting_sock}, math.max(connect_deadline - socket.gettime(), 0))
+    else
+        socket.sleep(math.max(next_connect_time - socket.gettime(), 0))
+    end
+    connected = connect_to_server()
+end
+
+if connected then
     print("[Lua] Bot ready for operation!")
 else
     print("[Lua] ❌ Could not establish initial connection")
@@ -444,7 +475,8 @@ else
 end
 
 -- Reset reconnection delay for ongoing operation
-reconnect_delay = 2
+reconnect_delay = initial_reconnect_delay
+next_connect_time = 0
 
 print("[Lua] 🌙 Starting operation - Press Stop Script to quit")
 while true do
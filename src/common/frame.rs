@@ -1,5 +1,5 @@
 use chrono::{DateTime, Utc};
-use image::DynamicImage;
+use image::{DynamicImage, GenericImageView, SubImage};
 use std::sync::Arc;
 use uuid::Uuid;
 
@@ -29,6 +29,22 @@ impl Frame {
     pub fn get_client_id(&self) -> Uuid {
         self.client_id
     }
+
+    pub fn image(&self) -> &DynamicImage {
+        &self.image
+    }
+
+    // The emulator stacks both DS screens vertically, these hand out borrowed views
+    // of each half so analyzers can look at one screen without copying pixels.
+    pub fn top_screen(&self) -> SubImage<&DynamicImage> {
+        let (width, height) = self.image.dimensions();
+        self.image.view(0, 0, width, height / 2)
+    }
+
+    pub fn bottom_screen(&self) -> SubImage<&DynamicImage> {
+        let (width, height) = self.image.dimensions();
+        self.image.view(0, height / 2, width, height - height / 2)
+    }
 }
 
 #[cfg(test)]
@@ -45,4 +61,22 @@ mod tests {
         let f2 = f1.clone();
         assert!(Arc::ptr_eq(&f1.image, &f2.image));
     }
+
+    #[test]
+    fn screens_are_views_of_each_half() {
+        let img: DynamicImage = DynamicImage::ImageRgb8(ImageBuffer::from_fn(4, 8, |_, y| {
+            if y < 4 {
+                Rgb([255, 0, 0])
+            } else {
+                Rgb([0, 0, 255])
+            }
+        }));
+        let frame = Frame::new(Uuid::new_v4(), img, Utc::now(), Uuid::new_v4());
+        let top = frame.top_screen();
+        let bottom = frame.bottom_screen();
+        assert_eq!(top.dimensions(), (4, 4));
+        assert_eq!(bottom.dimensions(), (4, 4));
+        assert_eq!(top.get_pixel(0, 3).0, [255, 0, 0, 255]);
+        assert_eq!(bottom.get_pixel(0, 0).0, [0, 0, 255, 255]);
+    }
 }
@@ -18,20 +18,37 @@ pub enum GameAction {
     X = 10,
 }
 
+impl GameAction {
+    // Every action in discriminant order, so `ALL[action as usize] == action`.
+    pub const ALL: [GameAction; 11] = [
+        GameAction::A,
+        GameAction::B,
+        GameAction::Up,
+        GameAction::Down,
+        GameAction::Left,
+        GameAction::Right,
+        GameAction::Start,
+        GameAction::Select,
+        GameAction::L,
+        GameAction::R,
+        GameAction::X,
+    ];
+}
+
 impl Distribution<GameAction> for StandardUniform {
     fn sample<R: Rng + ?Sized>(&self, rng: &mut R) -> GameAction {
-        match rng.random_range(0..=10) {
-            0 => GameAction::A,
-            1 => GameAction::B,
-            2 => GameAction::Up,
-            3 => GameAction::Down,
-            4 => GameAction::Left,
-            5 => GameAction::Right,
-            6 => GameAction::Start,
-            7 => GameAction::Select,
-            8 => GameAction::L,
-            9 => GameAction::R,
-            _ => GameAction::X,
+        GameAction::ALL[rng.random_range(0..GameAction::ALL.len())]
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn all_is_in_discriminant_order() {
+        for (index, action) in GameAction::ALL.iter().enumerate() {
+            assert_eq!(*action as usize, index);
         }
     }
 }
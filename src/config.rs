@@ -1,10 +1,9 @@
-use serde::Deserialize;
-
 pub struct Configuration {
     pub rom_path: String,
     pub frame_buffer_size: usize,
     pub action_buffer_size: usize,
     pub enable_metrics: bool,
+    pub skip_duplicate_frames: bool,
 }
 
 impl Default for Configuration {
@@ -14,6 +13,7 @@ impl Default for Configuration {
             frame_buffer_size: 60,
             action_buffer_size: 10,
             enable_metrics: false,
+            skip_duplicate_frames: false,
         }
     }
 }
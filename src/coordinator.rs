@@ -1,9 +1,6 @@
 use crate::{
-    common::{frame::Frame, game_action::GameAction},
-    config::Configuration,
-    emulator::emulator_client::EmulatorClient,
-    error::AppError,
-    pipeline::orchestration::processing_pipeline::ProcessingPipeline,
+    common::frame::Frame, config::Configuration, emulator::emulator_client::EmulatorClient,
+    error::AppError, pipeline::orchestration::processing_pipeline::ProcessingPipeline,
 };
 use tokio::sync::mpsc::Receiver;
 use tokio_util::sync::CancellationToken;
@@ -30,7 +27,12 @@ impl Coordinator {
     ) -> tokio::task::JoinHandle<()> {
         let (frame_tx, frame_rx) = tokio::sync::mpsc::channel(configuration.frame_buffer_size);
         let (_action_tx, action_rx) = tokio::sync::mpsc::channel(configuration.action_buffer_size);
-        let mut client = EmulatorClient::new(action_rx, frame_tx, configuration.rom_path.clone());
+        let mut client = EmulatorClient::new(
+            action_rx,
+            frame_tx,
+            configuration.rom_path.clone(),
+            configuration.skip_duplicate_frames,
+        );
         let pipeline_task = Self::start_pipeline_task(pipeline, frame_rx, cancel_token.clone());
         let handler_task = tokio::spawn(async move {
             loop {
@@ -59,7 +61,7 @@ impl Coordinator {
                 if let Err(e) = response {
                     tracing::error!("Pipeline error: {}", e);
                 } else {
-                    tracing::info!("Pipeline got response.");
+                    tracing::debug!("Pipeline got response.");
                 }
             }
         });
@@ -115,6 +117,13 @@ impl CoordinatorBuilder {
         self
     }
 
+    // Drops frames identical to the last one sent when no input was applied, this
+    // will override the default configuration.
+    pub fn skip_duplicate_frames(mut self, skip_duplicate_frames: bool) -> Self {
+        self.configuration.skip_duplicate_frames = skip_duplicate_frames;
+        self
+    }
+
     pub fn pipeline(mut self, pipeline: ProcessingPipeline) -> Self {
         self.pipeline = Some(pipeline);
         self
@@ -8,15 +8,50 @@ use uuid::Uuid;
 use crate::common::Frame;
 use crate::{common::game_action::GameAction, error::AppError};
 
+// DeSmuME keypad bit for each GameAction, indexed by the action's discriminant.
+const KEYPAD_MASKS: [u16; GameAction::ALL.len()] = [
+    1 << 0,  // A
+    1 << 1,  // B
+    1 << 6,  // Up
+    1 << 7,  // Down
+    1 << 5,  // Left
+    1 << 4,  // Right
+    1 << 3,  // Start
+    1 << 2,  // Select
+    1 << 9,  // L
+    1 << 8,  // R
+    1 << 10, // X
+];
+
+// While the pipeline lags every frame is dropped, so the warning is only logged
+// for the first drop and then once per this many drops (about a second at 60 FPS).
+const DROPPED_FRAME_LOG_INTERVAL: u64 = 60;
+
+// Converts a B G R A pixel buffer into R G B, dropping the alpha channel.
+// Writing into a pre-sized destination keeps the loop free of capacity checks so
+// the compiler can vectorize the byte shuffle.
+fn bgra_to_rgb(src: &[u8], dst: &mut [u8]) {
+    for (out, px) in dst.chunks_exact_mut(3).zip(src.chunks_exact(4)) {
+        out[0] = px[2];
+        out[1] = px[1];
+        out[2] = px[0];
+    }
+}
+
 pub struct EmulatorClient {
     cancel_token: CancellationToken,
     emulator_thread: Option<std::thread::JoinHandle<()>>,
 }
 
 impl EmulatorClient {
-    pub fn new(action_rx: Receiver<GameAction>, frame_tx: Sender<Frame>, rom_path: String) -> Self {
+    pub fn new(
+        action_rx: Receiver<GameAction>,
+        frame_tx: Sender<Frame>,
+        rom_path: String,
+        skip_duplicate_frames: bool,
+    ) -> Self {
         let cancel_token = CancellationToken::new();
-        let mut emulator = Emulator::new(action_rx, frame_tx, rom_path);
+        let mut emulator = Emulator::new(action_rx, frame_tx, rom_path, skip_duplicate_frames);
         Self {
             cancel_token: cancel_token.clone(),
             emulator_thread: Some(std::thread::spawn(move || {
@@ -44,15 +79,27 @@ struct Emulator {
     frame_tx: Sender<Frame>,
     rom_path: String,
     id: Uuid,
+    skip_duplicate_frames: bool,
+    // Raw display buffer of the last frame handed to the pipeline.
+    last_display: Vec<u8>,
+    dropped_frames: u64,
 }
 
 impl Emulator {
-    pub fn new(action_rx: Receiver<GameAction>, frame_tx: Sender<Frame>, rom_path: String) -> Self {
+    pub fn new(
+        action_rx: Receiver<GameAction>,
+        frame_tx: Sender<Frame>,
+        rom_path: String,
+        skip_duplicate_frames: bool,
+    ) -> Self {
         Self {
             action_rx,
             frame_tx,
             rom_path,
             id: Uuid::new_v4(),
+            skip_duplicate_frames,
+            last_display: Vec::new(),
+            dropped_frames: 0,
         }
     }
     fn initalize_desmume(
@@ -80,75 +127,60 @@ impl Emulator {
     }
 
     fn prepare_action(&mut self, action: GameAction, desmume: &mut desmume_rs::DeSmuME) {
-        let mask: u16 = match action {
-            GameAction::A => 1 << 0,
-            GameAction::B => 1 << 1,
-            GameAction::Select => 1 << 2,
-            GameAction::Start => 1 << 3,
-            GameAction::Right => 1 << 4,
-            GameAction::Left => 1 << 5,
-            GameAction::Up => 1 << 6,
-            GameAction::Down => 1 << 7,
-            GameAction::R => 1 << 8,
-            GameAction::L => 1 << 9,
-            GameAction::X => 1 << 10,
-            // If GameAction::Y does not exist, map nothing for that slot
-            _ => 0,
-        };
-        if mask != 0 {
-            desmume.input_mut().keypad_update(mask);
-            tracing::info!("Applied keypad mask {:#018b} for action {:?}", mask, action);
-        } else {
-            tracing::warn!("No keypad mapping for action {:?}", action);
-        }
+        let mask = KEYPAD_MASKS[action as usize];
+        desmume.input_mut().keypad_update(mask);
+        tracing::debug!("Applied keypad mask {:#018b} for action {:?}", mask, action);
     }
 
-    fn get_dynamic_image(&mut self, desmume: &mut desmume_rs::DeSmuME) -> Option<DynamicImage> {
-        let buffer = desmume.display_buffer_as_rgbx();
-        let mut new_buffer: Vec<u8> = Vec::with_capacity(buffer.len() / 4 * 3);
-        // -- pixel order is B G R A; convert to R G B
-        for chunk in buffer.chunks_exact(4) {
-            // chunk = [B, G, R, A]
-            new_buffer.extend_from_slice(&[chunk[2], chunk[1], chunk[0]]);
+    fn get_dynamic_image(&self, buffer: &[u8]) -> Option<DynamicImage> {
+        // Check the size before allocating, then convert straight into the image's
+        // own storage rather than staging a Vec and validating it afterwards.
+        let pixels = desmume_rs::SCREEN_WIDTH as usize * desmume_rs::SCREEN_HEIGHT_BOTH as usize;
+        if buffer.len() / 4 != pixels {
+            tracing::error!("Failed to convert buffer to RGB image");
+            return None;
         }
-        let rgb_image = RgbImage::from_raw(
+        let mut rgb_image = RgbImage::new(
             desmume_rs::SCREEN_WIDTH as u32,
             desmume_rs::SCREEN_HEIGHT_BOTH as u32,
-            new_buffer,
         );
-        match rgb_image {
-            Some(rgb_image) => {
-                let image = DynamicImage::ImageRgb8(rgb_image);
-                return Some(image);
-            }
-            None => {
-                tracing::error!("Failed to convert buffer to RGB image");
-                return None;
-            }
-        }
+        bgra_to_rgb(buffer, &mut rgb_image);
+        Some(DynamicImage::ImageRgb8(rgb_image))
     }
 
-    fn process_frame(&mut self, desmume: &mut desmume_rs::DeSmuME) {
-        let image = self.get_dynamic_image(desmume);
-        match image {
+    fn process_frame(&mut self, desmume: &mut desmume_rs::DeSmuME, action_applied: bool) {
+        let buffer = desmume.display_buffer_as_rgbx();
+        // With no input this cycle an unchanged screen tells the pipeline nothing new,
+        // so skip converting and sending it.
+        if self.skip_duplicate_frames && !action_applied && self.last_display[..] == buffer[..] {
+            return;
+        }
+        // Reserve a slot before converting, frames that would be dropped anyway
+        // shouldn't pay for the conversion.
+        let permit = match self.frame_tx.try_reserve() {
+            Ok(permit) => permit,
+            Err(TrySendError::Full(_)) => {
+                // Drop frame to keep real-time
+                self.dropped_frames += 1;
+                if self.dropped_frames % DROPPED_FRAME_LOG_INTERVAL == 1 {
+                    tracing::warn!(
+                        "Dropping frame: channel full ({} dropped so far)",
+                        self.dropped_frames
+                    );
+                }
+                return;
+            }
+            Err(TrySendError::Closed(_)) => {
+                tracing::warn!("Frame channel closed, stopping emulator loop");
+                return;
+            }
+        };
+        match self.get_dynamic_image(&buffer[..]) {
             Some(image) => {
-                match self
-                    .frame_tx
-                    .try_send(Frame::new(self.id, image, Utc::now(), Uuid::new_v4()))
-                {
-                    Ok(_) => {}
-                    Err(err) => match err {
-                        TrySendError::Full(_) => {
-                            // Drop frame to keep real-time
-                            tracing::warn!("Dropping frame: channel full");
-                        }
-                        TrySendError::Closed(_) => {
-                            tracing::warn!("Frame channel closed, stopping emulator loop");
-                        }
-                        _ => {
-                            tracing::error!("Failed to send frame: {}", err);
-                        }
-                    },
+                permit.send(Frame::new(self.id, image, Utc::now(), Uuid::new_v4()));
+                if self.skip_duplicate_frames {
+                    self.last_display.clear();
+                    self.last_display.extend_from_slice(&buffer[..]);
                 }
             }
             None => {
@@ -164,9 +196,11 @@ impl Emulator {
         match desmume {
             Ok(mut desmume) => {
                 while desmume.is_running() && !cancel_token.is_cancelled() {
+                    let mut action_applied = false;
                     match self.action_rx.try_recv() {
                         Ok(action) => {
                             self.prepare_action(action, &mut desmume);
+                            action_applied = true;
                         }
                         Err(TryRecvError::Disconnected) => {
                             tracing::error!("Action channel closed, stopping emulator loop");
@@ -177,8 +211,12 @@ impl Emulator {
                         }
                     }
                     desmume.cycle();
-                    self.release_key(&mut desmume);
-                    self.process_frame(&mut desmume);
+                    // Keys are only held on frames that applied an action; the
+                    // keypad is already clear otherwise.
+                    if action_applied {
+                        self.release_key(&mut desmume);
+                    }
+                    self.process_frame(&mut desmume, action_applied);
                 }
                 tracing::info!("Emulator stopped game, with unique id: {}", self.id);
             }
@@ -189,3 +227,26 @@ impl Emulator {
         }
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn bgra_to_rgb_swaps_channels_and_drops_alpha() {
+        let src = [1, 2, 3, 255, 4, 5, 6, 255];
+        let mut dst = [0u8; 6];
+        bgra_to_rgb(&src, &mut dst);
+        assert_eq!(dst, [3, 2, 1, 6, 5, 4]);
+    }
+
+    #[test]
+    fn keypad_masks_follow_action_discriminants() {
+        assert_eq!(KEYPAD_MASKS[GameAction::A as usize], 1 << 0);
+        assert_eq!(KEYPAD_MASKS[GameAction::Select as usize], 1 << 2);
+        assert_eq!(KEYPAD_MASKS[GameAction::Right as usize], 1 << 4);
+        assert_eq!(KEYPAD_MASKS[GameAction::X as usize], 1 << 10);
+        let all = KEYPAD_MASKS.iter().fold(0u16, |acc, mask| acc | mask);
+        assert_eq!(all.count_ones() as usize, KEYPAD_MASKS.len());
+    }
+}
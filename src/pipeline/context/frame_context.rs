@@ -3,12 +3,11 @@ use crate::pipeline::context::metrics::FrameMetrics;
 use crate::pipeline::context::state::AnalyzedState;
 use crate::pipeline::context::state::IngestedState;
 use crate::pipeline::domain::scene_analysis::SceneAnalysis;
-use std::sync::Arc;
 use std::time::{Duration, Instant};
 
 // FrameContext with compile-time state tracking via the phantom data
 pub struct FrameContext<S> {
-    frame: Arc<Frame>,
+    frame: Frame,
     metrics: FrameMetrics,
     processing_start: Instant,
     state: S,
@@ -31,7 +30,7 @@ impl<S> FrameContext<S> {
 impl FrameContext<IngestedState> {
     pub fn new(frame: Frame) -> Self {
         Self {
-            frame: Arc::new(frame),
+            frame,
             metrics: FrameMetrics::new(),
             processing_start: Instant::now(),
             state: IngestedState,